@@ -1,41 +1,64 @@
 import argparse
+import concurrent.futures
+import functools
 import json
 import os
 import pathlib
+import pickle
+import re
+import shlex
+import shutil
+import subprocess
 
-import inquirer
-from blessings import Terminal
-from inquirer.themes import Theme
-from prompt_toolkit import prompt
-from prompt_toolkit.completion import FuzzyWordCompleter
-from prompt_toolkit.output.color_depth import ColorDepth
-from prompt_toolkit.styles import Style
-from prompt_toolkit.validation import Validator
+try:
+    import orjson
+except ImportError:
+    # orjson is optional, json from standard library is used without it
+    orjson = None
 
 
-class CustomTheme(Theme):
+INDEX_CACHE_VERSION = 3
+FZF_MAX_COMPLETIONS = 200
+
+
+class CustomTheme:
     """
-    Custom theme for prompts. Inherits from Theme and in init sets
-    colors for inquirer prompt and static method get_prompt_style()
-    returns style for prompt_toolkit prompt.
+    Custom theme for prompts. Class method get_inquirer_theme()
+    returns theme for inquirer prompt and static method get_prompt_style()
+    returns style for prompt_toolkit prompt. Prompt libraries are imported
+    only when their theme is requested so each flow of the script loads
+    just the library it actually uses. Inquirer theme and prompt style
+    are created once, on first use, and then reused.
     """
-    term = Terminal()
     dark_cyan = '#0AA'
     bright_cyan = '#5FF'
     bright_blue = '#55F'
     bright_yellow = '#FF5'
     gray = 'gray'
-
-    def __init__(self):
-        super().__init__()
-        self.Question.mark_color = self.term.bold_bright_yellow
-        self.Question.brackets_color = self.term.bold_bright_blue
-        self.List.selection_color = self.term.bold_bright_cyan
-        self.List.selection_cursor = '❯'
-        self.List.unselected_color = self.term.cyan
+    # ANSI escape sequences used by inquirer theme
+    ansi_cyan = '\x1b[36m'
+    ansi_bold_bright_cyan = '\x1b[1;96m'
+    ansi_bold_bright_blue = '\x1b[1;94m'
+    ansi_bold_bright_yellow = '\x1b[1;93m'
+
+    @classmethod
+    @functools.lru_cache(maxsize=None)
+    def get_inquirer_theme(cls):
+        from inquirer.themes import Theme
+
+        theme = Theme()
+        theme.Question.mark_color = cls.ansi_bold_bright_yellow
+        theme.Question.brackets_color = cls.ansi_bold_bright_blue
+        theme.List.selection_color = cls.ansi_bold_bright_cyan
+        theme.List.selection_cursor = '❯'
+        theme.List.unselected_color = cls.ansi_cyan
+        return theme
 
     @staticmethod
+    @functools.lru_cache(maxsize=None)
     def get_prompt_style():
+        from prompt_toolkit.styles import Style
+
         return Style.from_dict({
             'brackets': f'{CustomTheme.bright_blue} bold',
             'question_mark': f'{CustomTheme.bright_yellow} bold',
@@ -78,6 +101,13 @@ def parse_args():
             ' in the global config file.'
         )
     )
+    parser.add_argument(
+        '--refresh-index', action='store_true',
+        help=(
+            'If present, ignore cached index of projects and walk all paths'
+            ' predefined in the global config file again.'
+        )
+    )
     return parser.parse_args()
 
 
@@ -96,17 +126,18 @@ def get_subproject_choices(config):
     list of strings
         Paths to all subprojects
     """
-    return filter_directories([
-        project for project in os.listdir(config['project_path'])
-            if os.path.isdir(os.path.join(config['project_path'], project))
-    ], config)
+    exclude_dirs, match_prefix = get_exclude_filters(config)
+    with os.scandir(config['project_path']) as entries:
+        return list(filter_directories(
+            (entry.name for entry in entries if entry.is_dir()),
+            exclude_dirs, match_prefix
+        ))
 
 
+@functools.lru_cache(maxsize=None)
 def get_default_shell():
     """ Returns name of default shell of the system. """
-    shell_path = os.environ.get('SHELL', '/bin/bash')
-    _, _, shell = shell_path.rpartition('/')
-    return shell
+    return os.path.basename(os.environ.get('SHELL', '/bin/bash'))
 
 
 def open_project_terminal(project_path, shell, config):
@@ -127,20 +158,26 @@ def open_project_terminal(project_path, shell, config):
     light_cyan = '\\033[1;36m'
     light_green = '\\033[1;32m'
 
+    # printf expands escapes only in its format, so quoted command
+    # passed as argument is printed exactly as it is written
+    command_template = (
+        f"printf '{light_cyan}Executing command:{no_color}"
+        f" {light_green}%s{no_color}\\n' {{}};{{}};"
+    )
+
     commands_to_execute = config['custom_commands'] + [f'{config["editor"]} .']
-    commands_plus_echo = [
-        f'echo -e \\"{light_cyan}Executing command:{no_color}\\"'\
-        f' \\"{light_green}{command}{no_color}\\";{command};'
-            for command in commands_to_execute
-    ]
-    os.system(
-        f"""
-        gnome-terminal -e '{shell} -c "
-        cd {project_path};
-        {''.join(commands_plus_echo)}
-        {shell}"'
-        """
+    commands_plus_echo = ''.join(
+        command_template.format(shlex.quote(command), command)
+        for command in commands_to_execute
     )
+    try:
+        subprocess.Popen([
+            'gnome-terminal', '--', shell, '-c',
+            f'cd {shlex.quote(project_path)};{commands_plus_echo}exec {shell}'
+        ])
+    except FileNotFoundError:
+        print('\ngnome-terminal not found, cannot open project\n')
+        exit(1)
 
 
 def check_dependency_manager(project_path, config):
@@ -160,9 +197,9 @@ def check_dependency_manager(project_path, config):
     config: dict
         Contains settings.
     """
-    dir_content = os.listdir(project_path)
     for manager_info in config['dependency_managers']:
-        if manager_info['file'] in dir_content:
+        # checking each file directly is cheaper than listing whole project
+        if os.path.lexists(os.path.join(project_path, manager_info['file'])):
             manager = manager_info
             break
     else:
@@ -173,6 +210,8 @@ def check_dependency_manager(project_path, config):
             manager, config['custom_commands']
         )
     elif config.get('ask_for_env_activation', False):
+        import inquirer
+
         questions = [
             inquirer.List(
                 'manager',
@@ -184,7 +223,9 @@ def check_dependency_manager(project_path, config):
             )
         ]
 
-        answers = inquirer.prompt(questions, theme=CustomTheme())
+        answers = inquirer.prompt(
+            questions, theme=CustomTheme.get_inquirer_theme()
+        )
         if answers is None:
             exit(0)
         if answers['manager'] == 'Yes please':
@@ -211,6 +252,8 @@ def add_env_to_custom_commands(manager, custom_commands):
 
 def ask_for_subproject_from_choices(choices):
     """ Returns project selected by user from choices """
+    import inquirer
+
     questions = [
         inquirer.List(
             'project',
@@ -218,7 +261,9 @@ def ask_for_subproject_from_choices(choices):
             choices=choices,
         ),
     ]
-    answers = inquirer.prompt(questions, theme=CustomTheme())
+    answers = inquirer.prompt(
+        questions, theme=CustomTheme.get_inquirer_theme()
+    )
     if answers is None:
         exit(0)
     return answers['project']
@@ -248,48 +293,405 @@ def select_project(config):
     return os.path.join(config['project_path'], selected_subproject)
 
 
-def filter_directories(directories, config):
+def get_exclude_filters(config):
+    """
+    Returns excluded directory names as frozenset and ignored prefixes
+    compiled into single regular expression, so they can be built once
+    and reused for every directory. Filters are memoized in config.
+
+    Parameters
+    ----------
+    config : dict
+        Contains settings.
+
+    Returns
+    -------
+    frozenset
+        Names of directories that should be excluded.
+    callable
+        Match method of compiled pattern, matches names starting
+        with any of the prefixes that should be ignored.
+    """
+    if '_exclude_filters' not in config:
+        prefixes = '|'.join(
+            re.escape(p) for p in config['exclude_prefixes']
+        )
+        # (?!) never matches, otherwise empty pattern would match every name
+        prefix_pattern = re.compile(prefixes or '(?!)')
+        config['_exclude_filters'] = (
+            frozenset(config['exclude_dirs']), prefix_pattern.match
+        )
+    return config['_exclude_filters']
+
+
+def filter_directories(directories, exclude_dirs, match_prefix):
     """
     Filters out directories that should be excluded or starts with
-    prefix that should be ignored.
+    prefix that should be ignored. Directories are filtered lazily
+    so any iterable can be passed without building list first.
+
+    Parameters
+    ----------
+    directories : iterable of strings
+        Names of directories.
+    exclude_dirs : frozenset
+        Names of directories that should be excluded.
+    match_prefix : callable
+        Matches names starting with prefix that should be ignored.
+
+    Returns
+    -------
+    generator of strings
+        Names of directories that passed the filter.
     """
-    return [
-        d for d in directories if d not in config['exclude_dirs']
-            and d.startswith(tuple(config['exclude_prefixes'])) is False
-    ]
+    return (
+        d for d in directories
+            if d not in exclude_dirs and not match_prefix(d)
+    )
+
+
+def scan_directories(root, exclude_dirs, match_prefix, project_markers):
+    """
+    Walks directory tree under root and yields names and parent paths
+    of all directories that were not filtered out, root included.
+    Directory containing any of the project markers is a project
+    itself, so the walk does not descend into it. Root is always walked
+    as it is a container of projects even if it contains a marker.
+    Uses os.scandir so the type of each entry is taken from the directory
+    listing itself instead of calling stat on every child. Symlinks are
+    not followed and directories that cannot be listed are skipped,
+    same as os.walk does by default.
+
+    Parameters
+    ----------
+    root : str
+        Path where the walk starts.
+    exclude_dirs : frozenset
+        Names of directories that should not be walked.
+    match_prefix : callable
+        Matches names starting with prefix that should not be walked.
+    project_markers : frozenset
+        Names of files or directories that mark root of a project.
+
+    Yields
+    ------
+    tuple of strings
+        Name of directory and path to its parent.
+    """
+    root = os.path.normpath(root)
+    parent, name = os.path.split(root)
+    stack = [(root, name, parent, True)]
+    while stack:
+        path, name, parent, is_root = stack.pop()
+        try:
+            with os.scandir(path) as entries:
+                subdirs = []
+                for entry in entries:
+                    entry_name = entry.name
+                    if entry_name in project_markers and not is_root:
+                        subdirs = []
+                        break
+                    # excluded directories are dropped before they are walked
+                    if entry_name not in exclude_dirs \
+                            and not match_prefix(entry_name) \
+                            and entry.is_dir(follow_symlinks=False):
+                        subdirs.append((entry.path, entry_name, path, False))
+        except OSError:
+            continue
+        yield name, parent
+        stack.extend(subdirs)
+
+
+def load_json(content):
+    """
+    Parses JSON document from bytes. Uses orjson if it is installed
+    and falls back to json for documents orjson refuses
+    (e.g. lone surrogates escaped by json.dumps).
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(content)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(content)
+
+
+def dump_json(obj):
+    """
+    Serializes obj to JSON document in bytes. Uses orjson if it is
+    installed and falls back to json for objects orjson refuses
+    (e.g. directory names that are not valid UTF-8).
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except orjson.JSONEncodeError:
+            pass
+    return json.dumps(obj).encode()
+
+
+@functools.lru_cache(maxsize=None)
+def get_cache_dir():
+    """ Returns path to directory where cached data are stored. """
+    cache_home = os.environ.get(
+        'XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')
+    )
+    return os.path.join(cache_home, 'project-loader')
+
+
+def write_cache_file(file_name, content):
+    """
+    Writes content to file in cache directory. File is replaced
+    atomically so concurrently running instances never read
+    partially written cache.
+
+    Parameters
+    ----------
+    file_name : str
+        Name of the file in cache directory.
+    content : bytes
+        Content of the file.
+    """
+    cache_dir = get_cache_dir()
+    cache_path = os.path.join(cache_dir, file_name)
+    tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(tmp_path, 'wb') as cf:
+            cf.write(content)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        # caching is only an optimization, failing to write it is not fatal
+        pass
+
+
+def load_index_cache(config):
+    """
+    Loads cached index of directories found in default projects paths.
+    Cache is discarded when it was created by different version
+    of the index or with different exclude or project markers settings.
+
+    Parameters
+    ----------
+    config : dict
+        Contains settings.
+
+    Returns
+    -------
+    dict
+        Maps each indexed projects path to its mtime and list of
+        directories found under it. Empty if there is no usable cache.
+    """
+    try:
+        with open(os.path.join(get_cache_dir(), 'index.json'), 'rb') as cf:
+            cache = load_json(cf.read())
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(cache, dict) \
+            or cache.get('version') != INDEX_CACHE_VERSION \
+            or cache.get('exclude_dirs') != config['exclude_dirs'] \
+            or cache.get('exclude_prefixes') != config['exclude_prefixes'] \
+            or cache.get('project_markers') \
+                != config.get('project_markers', []):
+        return {}
+    roots = cache.get('roots')
+    # broken cache is treated as missing, index is then built again
+    if not isinstance(roots, dict) or not all(
+        isinstance(root, dict) and 'mtime_ns' in root and 'dirs' in root
+            for root in roots.values()
+    ):
+        return {}
+    return roots
+
+
+def save_index_cache(roots, config):
+    """
+    Saves index of directories found in default projects paths.
+
+    Parameters
+    ----------
+    roots : dict
+        Maps each indexed projects path to its mtime and list of
+        directories found under it.
+    config : dict
+        Contains settings.
+    """
+    cache = {
+        'version': INDEX_CACHE_VERSION,
+        'exclude_dirs': config['exclude_dirs'],
+        'exclude_prefixes': config['exclude_prefixes'],
+        'project_markers': config.get('project_markers', []),
+        'roots': roots,
+    }
+    write_cache_file('index.json', dump_json(cache))
 
 
-def find_project_by_name(config):
+def get_fzf_completer(words, meta_dict, fzf_path):
+    """
+    Creates completer that delegates fuzzy matching to fzf. Used instead
+    of FuzzyWordCompleter when there are too many words to score them
+    in Python on every keystroke. Each search runs `fzf --filter`
+    in background thread with all words piped to its stdin.
+
+    Parameters
+    ----------
+    words : list of strings
+        Words to complete.
+    meta_dict : dict
+        Maps words to meta text displayed next to completions.
+    fzf_path : str
+        Path to fzf executable.
+
+    Returns
+    -------
+    prompt_toolkit.completion.Completer
+        Completer for prompt_toolkit prompt.
+    """
+    from prompt_toolkit.completion import (
+        Completer, Completion, ThreadedCompleter
+    )
+
+    candidates = '\n'.join(words).encode('utf-8', 'surrogateescape')
+
+    class FzfCompleter(Completer):
+        def get_completions(self, document, complete_event):
+            query = document.text_before_cursor
+            if query:
+                result = subprocess.run(
+                    [fzf_path, '--filter', query], input=candidates,
+                    stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+                )
+                matches = result.stdout.decode(
+                    'utf-8', 'surrogateescape'
+                ).splitlines()
+            else:
+                matches = words
+            for word in matches[:FZF_MAX_COMPLETIONS]:
+                yield Completion(
+                    word, start_position=-len(query),
+                    display_meta=meta_dict.get(word, '')
+                )
+
+    return ThreadedCompleter(FzfCompleter())
+
+
+def get_project_choices(directories):
+    """
+    Creates choices for project search from found directories.
+    Duplicates (e.g. from overlapping projects paths) are dropped
+    and choices are ordered from the shortest name, so the completer
+    scans fewer words and lists likely hits first. Directories sharing
+    the same name are distinguished by numeric suffix (e.g. api~2)
+    so none of them is hidden from the search.
+
+    Parameters
+    ----------
+    directories : list of tuples
+        Name of each directory and path to its parent.
+
+    Returns
+    -------
+    dict
+        Maps choice to path of the parent directory.
+    dict
+        Maps choices with suffix to real name of the directory.
+    """
+    choices = {}
+    renamed = {}
+    unique_directories = sorted(
+        set(map(tuple, directories)),
+        key=lambda directory: (len(directory[0]), directory)
+    )
+    for name, parent in unique_directories:
+        choice = name
+        suffix = 1
+        while choice in choices:
+            suffix += 1
+            choice = f'{name}~{suffix}'
+        choices[choice] = parent
+        if suffix > 1:
+            renamed[choice] = name
+    return choices, renamed
+
+
+def find_project_by_name(config, refresh_index=False):
     """
     Implements search prompt to find project by name entered
-    by user. Uses fuzzy logic to match search with project names.
+    by user. Uses fuzzy logic to match search with project names,
+    matching is done by fzf (if installed) when number of projects
+    exceeds threshold set in config. Directories found in default
+    projects paths are cached and each path is walked again only
+    when its mtime changes.
 
     Parameters
     ----------
     config : dict
         Contains settings.
+    refresh_index : bool
+        If True, cached index is ignored and all paths are walked again.
 
     Returns
     -------
     str
         Path to project selected by user based on his search.
     """
-    def get_possible_project_directories(config):
-        possible_directories = []
+    from prompt_toolkit import prompt
+    from prompt_toolkit.completion import FuzzyWordCompleter
+    from prompt_toolkit.output.color_depth import ColorDepth
+    from prompt_toolkit.validation import Validator
+
+    def get_possible_project_directories(config, refresh_index):
+        exclude_dirs, match_prefix = get_exclude_filters(config)
+        project_markers = frozenset(config.get('project_markers', []))
+        cached_roots = {} if refresh_index else load_index_cache(config)
+        roots = {}
+        outdated_paths = []
         for projects_path in config['default_projects_paths']:
-            for root, dirs, files in os.walk(projects_path):
-                # modifying dirs directly to prune search tree
-                dirs[:] = filter_directories(dirs, config)
-                possible_directories.append(root)
-        return possible_directories
+            if projects_path in roots:
+                # path listed more than once is walked only once
+                continue
+            try:
+                mtime_ns = os.stat(projects_path).st_mtime_ns
+            except OSError:
+                continue
+            root = cached_roots.get(projects_path)
+            if root is None or root['mtime_ns'] != mtime_ns:
+                root = {'mtime_ns': mtime_ns, 'dirs': []}
+                outdated_paths.append(projects_path)
+            roots[projects_path] = root
+
+        if outdated_paths:
+            # roots are independent and scandir releases GIL while
+            # listing directories, so they are walked in parallel
+            with concurrent.futures.ThreadPoolExecutor(
+                max_workers=min(8, len(outdated_paths))
+            ) as executor:
+                scanned_dirs = executor.map(
+                    lambda path: list(scan_directories(
+                        path, exclude_dirs, match_prefix, project_markers
+                    )),
+                    outdated_paths
+                )
+                for projects_path, dirs in zip(outdated_paths, scanned_dirs):
+                    roots[projects_path]['dirs'] = dirs
+        if roots != cached_roots:
+            save_index_cache(roots, config)
 
-    possible_directories = get_possible_project_directories(config)
-    parts = [os.path.split(d) for d in possible_directories]
-    projects_paths_dict = {project: path for path, project in parts}
+        possible_directories = []
+        for root in roots.values():
+            possible_directories.extend(root['dirs'])
+        return possible_directories
 
-    completer = FuzzyWordCompleter(
-        projects_paths_dict.keys(), meta_dict=projects_paths_dict
+    possible_directories = get_possible_project_directories(
+        config, refresh_index
     )
+    choices, renamed = get_project_choices(possible_directories)
+
+    fzf_path = shutil.which('fzf')
+    if fzf_path and len(choices) > config.get('fzf_threshold', 5000):
+        completer = get_fzf_completer(list(choices), choices, fzf_path)
+    else:
+        completer = FuzzyWordCompleter(list(choices), meta_dict=choices)
     validator = Validator.from_callable(
         lambda text: ' ' not in text,
         error_message=('Spaces in project name? Really?'),
@@ -310,13 +712,15 @@ def find_project_by_name(config):
         print('\nCancelled by user\n')
         exit(0)
 
-    return os.path.join(projects_paths_dict[project], project)
+    return os.path.join(choices[project], renamed.get(project, project))
 
 
 def load_configs(project_config):
     """
     Loads global and user project config. Project config
-    can rewrite settings set in global config.
+    can rewrite settings set in global config. Loaded configuration
+    is pickled to cache directory and reused until modification time
+    or size of any of the config files changes.
 
     Parameters
     ----------
@@ -331,13 +735,36 @@ def load_configs(project_config):
     script_dir = pathlib.Path(__file__).parent.absolute()
     global_conf_path = os.path.join(script_dir, 'configs/global_config.json')
     project_conf_dir_path = os.path.join(script_dir, 'configs/user_configs')
-    with open(global_conf_path, 'r') as cf:
-        config = json.load(cf)
+    conf_paths = [global_conf_path]
+    cache_name = 'config.pkl'
     if project_config:
         project_config = project_config if project_config[:-4] == '.json' \
             else f'{project_config}.json'
-        with open(os.path.join(project_conf_dir_path, project_config)) as cf:
-            config.update(json.load(cf))
+        conf_paths.append(os.path.join(project_conf_dir_path, project_config))
+        cache_name = f'config.{project_config}.pkl'
+
+    cache_key = []
+    for conf_path in conf_paths:
+        conf_stat = os.stat(conf_path)
+        cache_key.append(
+            (conf_path, conf_stat.st_mtime_ns, conf_stat.st_size)
+        )
+    try:
+        with open(os.path.join(get_cache_dir(), cache_name), 'rb') as cf:
+            cache = pickle.load(cf)
+        if cache['key'] == cache_key:
+            return cache['config']
+    except Exception:
+        # missing or broken cache, configs are loaded from json below
+        pass
+
+    config = {}
+    for conf_path in conf_paths:
+        with open(conf_path, 'rb') as cf:
+            config.update(load_json(cf.read()))
+    write_cache_file(
+        cache_name, pickle.dumps({'key': cache_key, 'config': config})
+    )
     return config
 
 
@@ -348,7 +775,7 @@ def main():
         project_path = select_project(config)
     else:
         # find_project is present in args
-        project_path = find_project_by_name(config)
+        project_path = find_project_by_name(config, args.refresh_index)
 
     shell = get_default_shell()
     check_dependency_manager(project_path, config)